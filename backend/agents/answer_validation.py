@@ -3,17 +3,22 @@ import pandas as pd
 import numpy as np
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
+from agents.llm_scheduler import shared_llm
+from agents.frame_isolation import run_isolated
 from typing import Dict, Any
 
 class AnswerValidation:
     """Validates query execution results by recomputing with an alternative method."""
 
     def __init__(self, groq_api_key):
-        self.llm = ChatGroq(model="llama3-70b-8192", temperature=0, groq_api_key=groq_api_key)
+        self.llm = shared_llm(groq_api_key)
 
-    def validate_result(self, df: pd.DataFrame, query: str, executed_code: str, result: Any) -> Dict:
-        """Generates an alternative validation method to verify query results and provides a justification."""
+    def validate_result(self, df: pd.DataFrame, query: str, executed_code: str, result: Any, conversation=None) -> Dict:
+        """Generates an alternative validation method to verify query results and provides a justification.
+
+        With a `ConversationState`, previous results that the executed code builds on are
+        available to the validation code as well.
+        """
 
         validation_prompt = PromptTemplate.from_template(
             """You are a Python data validation expert. Your task is to generate an alternative Pandas command 
@@ -25,8 +30,11 @@ class AnswerValidation:
             - If the result is a **numeric value**, allow a small tolerance of ±0.01 for rounding differences.
             - If the result is a **DataFrame or Series**, ensure the column order and data types match.
             - Do not include explanations, markdown, or extra text.
+            - Previous results listed below are available as DataFrame variables, like `df`.
 
             User Query: {query}
+            Previous Results:
+            {views}
             Original Executed Code:
             ```python
             {executed_code}
@@ -44,7 +52,8 @@ class AnswerValidation:
             """
         )
 
-        validation_message = validation_prompt.format_prompt(query=query, executed_code=executed_code)
+        views = conversation.describe_views(exclude_query=query) if conversation is not None else "None"
+        validation_message = validation_prompt.format_prompt(query=query, executed_code=executed_code, views=views)
         validation_response = self.llm.invoke([HumanMessage(content=validation_message.to_string())])
         validation_code = validation_response.content.strip()
 
@@ -61,10 +70,13 @@ class AnswerValidation:
                 "validation_code": validation_code
             }
 
-        # ✅ Execute validation code safely
-        local_vars = {"df": df, "pd": pd, "np": np}
+        # ✅ Execute validation code safely on a copy-on-write view of the session frame
+        extra_vars = {"np": np}
         try:
-            exec(validation_code, globals(), local_vars)
+            if conversation is not None:
+                parents = conversation.referenced_views(validation_code, exclude_query=query)
+                extra_vars.update(conversation.view_vars(df, parents))
+            local_vars = run_isolated(validation_code, df, extra_vars=extra_vars, source="validation")
             validation_result = local_vars.get("validation_result")
         except Exception as e:
             return {
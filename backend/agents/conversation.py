@@ -0,0 +1,180 @@
+# backend/agents/conversation.py
+
+import os
+import re
+import threading
+from collections import OrderedDict
+import pandas as pd
+from typing import Dict, List, Optional
+from agents.frame_isolation import isolated_view, run_isolated
+
+
+class SessionView:
+    """A previous query result kept as a named, lazily materialized view.
+
+    `lineage` is the ordered list of `(view_name, code)` steps that rebuild the
+    view from the session frame, so the frame itself can be dropped under
+    memory pressure and recomputed on demand.
+    """
+
+    def __init__(self, name: str, query: str, lineage: List[tuple], frame: pd.DataFrame):
+        self.name = name
+        self.query = query
+        self.lineage = lineage
+        self.columns = [str(col) for col in frame.columns]
+        self.index_names = [str(name) for name in frame.index.names if name is not None]
+        self.rows = len(frame)
+        self.nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        self._frame = frame
+
+    @property
+    def code(self) -> str:
+        return self.lineage[-1][1]
+
+    @property
+    def is_materialized(self) -> bool:
+        return self._frame is not None
+
+    def drop_frame(self):
+        self._frame = None
+
+    def build(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replays the view's lineage against `df` without caching the result."""
+        namespace = {}
+        for step_name, step_code in self.lineage:
+            local_vars = run_isolated(step_code, df, extra_vars=dict(namespace), source="view")
+            namespace[step_name] = as_frame(local_vars.get("result"))
+        return namespace[self.name]
+
+    def materialize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the view's frame, replaying its lineage against `df` if it was dropped."""
+        if self._frame is None:
+            self._frame = self.build(df)
+            self.rows = len(self._frame)
+            self.nbytes = int(self._frame.memory_usage(index=True, deep=True).sum())
+        return self._frame
+
+    def describe(self) -> str:
+        index = f", index: {', '.join(self.index_names)}" if self.index_names else ""
+        return (f"- `{self.name}` ({self.rows} rows{index}) from \"{self.query}\"\n"
+                f"  columns: {', '.join(self.columns)}\n"
+                f"  code: {self.code}")
+
+
+def as_frame(result) -> Optional[pd.DataFrame]:
+    """Converts a query result into a DataFrame view, or None for scalars and other types."""
+    if isinstance(result, pd.DataFrame):
+        return result
+    if isinstance(result, pd.Series):
+        return result.to_frame()
+    return None
+
+
+class ConversationState:
+    """Per-session history of query results that follow-up questions can build on.
+
+    Keeps at most `max_views` views; once their materialized frames exceed
+    `max_bytes`, the oldest frames are dropped and only their lineage is kept.
+    Frames are only cached when built from `source`, the current session frame, so
+    a query still running on the rows from before an append cannot cache stale views.
+    """
+
+    def __init__(self, max_views: int = None, max_bytes: int = None, source: pd.DataFrame = None):
+        self.max_views = max_views or int(os.environ.get("CONVERSATION_MAX_VIEWS", 5))
+        self.max_bytes = max_bytes or int(os.environ.get("CONVERSATION_MAX_VIEW_BYTES", 50 * 1024 * 1024))
+        self.views: "OrderedDict[str, SessionView]" = OrderedDict()
+        self._counter = 0
+        self._source = source
+        self._lock = threading.Lock()
+
+    def _is_current(self, df: pd.DataFrame) -> bool:
+        return self._source is None or df is self._source
+
+    def _visible(self, exclude_query: str = None) -> List[SessionView]:
+        # Re-running a question (validation, code conversion) must not just read back its own view
+        return [view for view in self.views.values() if exclude_query is None or view.query != exclude_query]
+
+    def describe_views(self, exclude_query: str = None) -> str:
+        with self._lock:
+            views = self._visible(exclude_query)
+            if not views:
+                return "None"
+            return "\n".join(view.describe() for view in views)
+
+    def describe_queries(self, exclude_query: str = None) -> str:
+        """Previous questions of the conversation, oldest first."""
+        with self._lock:
+            views = self._visible(exclude_query)
+            if not views:
+                return "None"
+            return "\n".join(f"- {view.query}" for view in views)
+
+    def referenced_views(self, code: str, exclude_query: str = None) -> List[SessionView]:
+        """Views whose names appear as identifiers in the generated code."""
+        with self._lock:
+            return [view for view in self._visible(exclude_query)
+                    if re.search(rf"\b{re.escape(view.name)}\b", code)]
+
+    def view_vars(self, df: pd.DataFrame, views: List[SessionView]) -> Dict[str, pd.DataFrame]:
+        """Materializes only the referenced views, each as a copy-on-write overlay."""
+        with self._lock:
+            if not self._is_current(df):
+                return {view.name: view.build(df) for view in views}
+            view_vars = {view.name: isolated_view(view.materialize(df)) for view in views}
+            self._evict()
+            return view_vars
+
+    def add_result(self, query: str, code: str, result, parents: List[SessionView],
+                   df: pd.DataFrame = None) -> Optional[str]:
+        """Stores a DataFrame/Series result as a new view; returns its name.
+
+        `df` is the frame the result was computed from; if the session data changed
+        meanwhile, only the lineage is kept and the frame is rebuilt on next use.
+        """
+        frame = as_frame(result)
+        if frame is None:
+            return None
+        with self._lock:
+            self._counter += 1
+            name = f"result_{self._counter}"
+            lineage = []
+            for parent in parents:
+                lineage.extend(step for step in parent.lineage if step not in lineage)
+            lineage.append((name, code))
+            view = self.views[name] = SessionView(name, query, lineage, frame)
+            if df is not None and not self._is_current(df):
+                view.drop_frame()
+            self._evict()
+        return name
+
+    def invalidate(self, source: pd.DataFrame) -> int:
+        """Switches to the new session frame `source` and drops every materialized frame;
+        lineage is kept so views are recomputed against the new data on next use.
+        Returns the number dropped."""
+        with self._lock:
+            self._source = source
+            dropped = 0
+            for view in self.views.values():
+                if view.is_materialized:
+                    view.drop_frame()
+                    dropped += 1
+            return dropped
+
+    def _evict(self):
+        while len(self.views) > self.max_views:
+            self.views.popitem(last=False)
+        total = sum(view.nbytes for view in self.views.values() if view.is_materialized)
+        for view in self.views.values():
+            if total <= self.max_bytes:
+                break
+            if view.is_materialized:
+                view.drop_frame()
+                total -= view.nbytes
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "views": len(self.views),
+                "materialized": sum(view.is_materialized for view in self.views.values()),
+                "materialized_bytes": sum(view.nbytes for view in self.views.values() if view.is_materialized),
+            }
@@ -1,18 +1,19 @@
 import pandas as pd
 import sqlite3
 from io import StringIO
+from typing import Dict
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
+from agents.llm_scheduler import shared_llm
 
 class FileProcessor:
     """Handles file uploads and extracts metadata."""
 
     def __init__(self, groq_api_key):
-        self.llm = ChatGroq(model="llama3-70b-8192", temperature=0, groq_api_key=groq_api_key)
+        self.llm = shared_llm(groq_api_key, priority="background")
 
-    def process_file(self, file_content: str, file_type: str):
-        """Reads and processes file content based on type."""
+    def read_file(self, file_content: str, file_type: str):
+        """Parses file content into a DataFrame without calling the LLM."""
         try:
             if file_type == "csv":
                 df = pd.read_csv(StringIO(file_content))
@@ -24,6 +25,18 @@ class FileProcessor:
                 df = pd.read_sql("SELECT * FROM sqlite_master WHERE type='table'", conn)
             else:
                 return {"error": "Unsupported file type"}
+            return {"dataframe": df}
+
+        except Exception as e:
+            return {"error": str(e)}
+
+    def process_file(self, file_content: str, file_type: str):
+        """Reads and processes file content based on type."""
+        try:
+            file_info = self.read_file(file_content, file_type)
+            if "error" in file_info:
+                return file_info
+            df = file_info["dataframe"]
 
             # Generate file overview using the LLM agent
             file_overview = self.generate_file_overview(df)
@@ -63,3 +76,71 @@ class FileProcessor:
         overview_response = self.llm.invoke([HumanMessage(content=overview_message.to_string())])
         
         return overview_response.content.strip()
+
+    def append_rows(self, df: pd.DataFrame, new_rows: pd.DataFrame) -> Dict:
+        """Appends rows to a session frame, keeping its columns and column types."""
+        if set(new_rows.columns) != set(df.columns):
+            return {"error": "Appended rows must have the same columns as the session data"}
+        new_rows = new_rows[list(df.columns)].copy()
+        for col in df.columns:
+            if new_rows[col].dtype != df[col].dtype:
+                # Only cast when nothing is lost (3.0 -> 3 is fine, 3.7 -> 3 or NaN -> True is not);
+                # otherwise concat decides the type and the check below accepts or rejects it
+                try:
+                    cast = new_rows[col].astype(df[col].dtype)
+                    if cast.astype(new_rows[col].dtype).equals(new_rows[col]):
+                        new_rows[col] = cast
+                except (TypeError, ValueError, OverflowError):
+                    pass
+        combined = pd.concat([df, new_rows], ignore_index=True)
+
+        # Only numeric widening (int -> float) is allowed; anything else (text in a numeric
+        # column, missing values in a bool column) is rejected
+        changed = [
+            str(col) for col in df.columns
+            if combined[col].dtype != df[col].dtype and not (
+                pd.api.types.is_numeric_dtype(df[col]) and pd.api.types.is_numeric_dtype(combined[col])
+                and not pd.api.types.is_bool_dtype(df[col]) and not pd.api.types.is_bool_dtype(combined[col])
+            )
+        ]
+        if changed:
+            return {"error": f"Appended rows have incompatible values for columns: {', '.join(changed)}"}
+        return {"dataframe": combined}
+
+    def profile_dataframe(self, df: pd.DataFrame) -> Dict:
+        """Computes per-column statistics that can be merged when rows are appended."""
+        profile = {"rows": len(df), "columns": {}}
+        for col in df.columns:
+            series = df[col]
+            stats = {"dtype": str(series.dtype), "count": int(series.count()), "nulls": int(series.isna().sum())}
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                has_values = stats["count"] > 0
+                stats["sum"] = float(series.sum())
+                stats["min"] = float(series.min()) if has_values else None
+                stats["max"] = float(series.max()) if has_values else None
+                stats["mean"] = stats["sum"] / stats["count"] if has_values else None
+            profile["columns"][str(col)] = stats
+        return profile
+
+    def merge_profiles(self, profile: Dict, new_profile: Dict, dtypes: Dict = None) -> Dict:
+        """Combines the profile of existing rows with the profile of appended rows."""
+        merged = {"rows": profile["rows"] + new_profile["rows"], "columns": {}}
+        for col, old in profile["columns"].items():
+            new = new_profile["columns"].get(col)
+            if new is None:
+                merged["columns"][col] = old
+                continue
+            stats = {
+                "dtype": str(dtypes[col]) if dtypes is not None and col in dtypes else new["dtype"],
+                "count": old["count"] + new["count"],
+                "nulls": old["nulls"] + new["nulls"],
+            }
+            if "sum" in old and "sum" in new:
+                stats["sum"] = old["sum"] + new["sum"]
+                present = [value for value in (old["min"], new["min"]) if value is not None]
+                stats["min"] = min(present) if present else None
+                present = [value for value in (old["max"], new["max"]) if value is not None]
+                stats["max"] = max(present) if present else None
+                stats["mean"] = stats["sum"] / stats["count"] if stats["count"] else None
+            merged["columns"][col] = stats
+        return merged
@@ -0,0 +1,124 @@
+# backend/agents/frame_isolation.py
+
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+# Counters for generated code that tried to write to the session frame
+_METRICS_LOCK = threading.Lock()
+ISOLATION_METRICS = {
+    "isolated_runs": 0,
+    "mutation_attempts": 0,
+    "mutated_columns": {},
+}
+
+
+_PANDAS_MAJOR = int(pd.__version__.split(".")[0])
+
+
+def enable_copy_on_write():
+    """Switches pandas 2 to copy-on-write; called once from the app's startup hook.
+
+    The option is global to the process, so it must be set before any session
+    frame exists and while no request threads run pandas, never per request.
+    Pandas 3+ always uses copy-on-write (and deprecates the option).
+    """
+    if _PANDAS_MAJOR == 2:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def copy_on_write_enabled() -> bool:
+    """Checks whether shallow copies are isolated from the session frame."""
+    if _PANDAS_MAJOR >= 3:
+        return True
+    return _PANDAS_MAJOR == 2 and bool(pd.get_option("mode.copy_on_write"))
+
+
+def isolated_view(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns a per-request overlay of the session frame.
+
+    Under copy-on-write the overlay is a zero-copy view: column buffers are
+    shared with the session frame until generated code writes to them, at which
+    point only the touched columns are copied into the overlay. Older pandas
+    builds without CoW fall back to a deep copy.
+    """
+    if copy_on_write_enabled():
+        return df.copy(deep=False)
+    return df.copy(deep=True)
+
+
+def _shares_buffer(left: pd.Series, right: pd.Series) -> bool:
+    """Checks whether two columns still point to the same underlying data."""
+    left_values = left.array
+    right_values = right.array
+    if left_values is right_values:
+        return True
+    # Arrow-backed columns are immutable, so identical chunked arrays mean no write
+    left_arrow = getattr(left_values, "_pa_array", None)
+    if left_arrow is not None:
+        return left_arrow is getattr(right_values, "_pa_array", None)
+    left_values = getattr(left_values, "_ndarray", left_values)
+    right_values = getattr(right_values, "_ndarray", right_values)
+    try:
+        return np.shares_memory(np.asarray(left_values), np.asarray(right_values))
+    except (TypeError, ValueError):
+        return False
+
+
+def detect_mutations(original: pd.DataFrame, overlay: pd.DataFrame) -> List[str]:
+    """Lists columns that generated code added, dropped or wrote to in the overlay."""
+    if original is overlay:
+        return []
+    mutated = [col for col in overlay.columns if col not in original.columns]
+    mutated += [col for col in original.columns if col not in overlay.columns]
+    if len(original) != len(overlay) or not original.index.equals(overlay.index):
+        return mutated + ["<index>"]
+    # A deep-copied overlay never shares buffers, so fall back to comparing values
+    unchanged = _shares_buffer if copy_on_write_enabled() else (lambda left, right: left.equals(right))
+    for col in original.columns:
+        if col in overlay.columns and not unchanged(original[col], overlay[col]):
+            mutated.append(col)
+    return mutated
+
+
+def run_isolated(code: str, df: pd.DataFrame, extra_vars: Dict = None, source: str = "query") -> Dict:
+    """Executes generated code against a copy-on-write view of `df`.
+
+    Returns the local namespace after execution. Writes land in the overlay
+    (`local_vars["df"]`) and never reach the session frame; any attempt is
+    recorded in `ISOLATION_METRICS`. Exceptions raised by the code propagate.
+    """
+    overlay = isolated_view(df)
+    local_vars = {"df": overlay, "pd": pd}
+    if extra_vars:
+        local_vars.update(extra_vars)
+    try:
+        exec(code, globals(), local_vars)
+    finally:
+        mutated = detect_mutations(df, overlay)
+        _record(source, mutated)
+    local_vars["mutated_columns"] = mutated
+    return local_vars
+
+
+def _record(source: str, mutated: List[str]):
+    """Updates isolation counters."""
+    with _METRICS_LOCK:
+        ISOLATION_METRICS["isolated_runs"] += 1
+        if mutated:
+            ISOLATION_METRICS["mutation_attempts"] += 1
+            per_column = ISOLATION_METRICS["mutated_columns"]
+            for col in mutated:
+                key = f"{source}:{col}"
+                per_column[key] = per_column.get(key, 0) + 1
+
+
+def get_isolation_metrics() -> Dict:
+    """Returns a snapshot of the isolation counters."""
+    with _METRICS_LOCK:
+        return {
+            "isolated_runs": ISOLATION_METRICS["isolated_runs"],
+            "mutation_attempts": ISOLATION_METRICS["mutation_attempts"],
+            "mutated_columns": dict(ISOLATION_METRICS["mutated_columns"]),
+        }
@@ -0,0 +1,56 @@
+# backend/agents/lazy_loading.py
+
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Seconds spent importing modules / building objects on first use, keyed by name
+STARTUP_TIMINGS: Dict[str, float] = {}
+# Steps that took longer than STARTUP_BUDGET_SECONDS
+STARTUP_OVER_BUDGET: Dict[str, float] = {}
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", 1.0))
+_TIMINGS_LOCK = threading.Lock()
+
+
+def record_timing(name: str, seconds: float):
+    """Stores how long a one-off startup step took and flags it if it exceeds the budget.
+
+    Applies to main.py's own import, every first-use import and agent build, and the
+    warm-up total, so startup cost moved to the first request is still checked.
+    """
+    seconds = round(seconds, 4)
+    with _TIMINGS_LOCK:
+        STARTUP_TIMINGS[name] = seconds
+        if seconds > STARTUP_BUDGET_SECONDS:
+            STARTUP_OVER_BUDGET[name] = seconds
+    if seconds > STARTUP_BUDGET_SECONDS:
+        logger.warning("Startup step %s took %.2fs (budget %.2fs)", name, seconds, STARTUP_BUDGET_SECONDS)
+
+
+def lazy_import(module_name: str):
+    """Imports a module on first use and records how long the import took."""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    record_timing(f"import:{module_name}", time.perf_counter() - started)
+    return module
+
+
+def get_startup_timings() -> Dict[str, float]:
+    """Returns a snapshot of recorded startup timings."""
+    with _TIMINGS_LOCK:
+        return dict(STARTUP_TIMINGS)
+
+
+def get_startup_over_budget() -> Dict[str, float]:
+    """Returns the startup steps that exceeded STARTUP_BUDGET_SECONDS."""
+    with _TIMINGS_LOCK:
+        return dict(STARTUP_OVER_BUDGET)
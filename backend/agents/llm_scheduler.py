@@ -0,0 +1,314 @@
+# backend/agents/llm_scheduler.py
+
+import os
+import heapq
+import random
+import threading
+import time
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List
+from agents.lazy_loading import lazy_import, record_timing
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "background": 1}
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Recognises Groq/OpenAI style rate-limit errors without importing the SDKs."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    name = type(error).__name__.lower()
+    return "ratelimit" in name or "rate limit" in str(error).lower()
+
+
+def _retry_after(error: Exception):
+    """Reads the Retry-After header from an SDK error, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Requests-per-minute and tokens-per-minute budget with priority-ordered waiters."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _wait_time(self, tokens: int) -> float:
+        missing_requests = max(0.0, 1 - self._requests)
+        missing_tokens = max(0.0, tokens - self._tokens)
+        return max(missing_requests * 60.0 / self.rpm, missing_tokens * 60.0 / self.tpm)
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Takes budget only if it is available right now and nobody is queued."""
+        tokens = min(tokens, self.tpm)
+        with self._cond:
+            self._refill()
+            if self._waiters or self._wait_time(tokens) > 0:
+                return False
+            self._requests -= 1
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens: int, priority: int = 0) -> float:
+        """Blocks until the call fits in the budget; returns the time spent waiting."""
+        tokens = min(tokens, self.tpm)
+        entry = (priority, next(self._seq))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == entry:
+                        delay = self._wait_time(tokens)
+                        if delay <= 0:
+                            self._requests -= 1
+                            self._tokens -= tokens
+                            return time.monotonic() - started
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def settle(self, reserved: int, used: int):
+        """Corrects a reservation with the tokens a call actually used.
+
+        Unused budget is returned; an overrun is charged, which may push the
+        bucket below zero and delay the next callers accordingly.
+        """
+        with self._cond:
+            self._tokens = min(self.tpm, self._tokens + min(reserved, self.tpm) - used)
+            self._cond.notify_all()
+
+
+class _InflightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMScheduler:
+    """Central gate for every LLM call made by the agents.
+
+    - Identical in-flight prompts are coalesced into one upstream call (singleflight).
+    - When limits are given, a token bucket enforces requests/tokens per minute,
+      serving interactive callers ahead of background ones. Without limits calls
+      are not throttled.
+    - Rate-limit errors are retried with jittered exponential backoff.
+    - Optionally, a call slower than the given latency percentile is hedged with
+      a second identical request and the first answer wins. `hedge_percentile`
+      is a fraction in (0, 1), e.g. 0.95 for p95.
+    """
+
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None,
+                 max_retries: int = 4, backoff_base: float = 1.0, backoff_cap: float = 30.0,
+                 hedge_percentile: float = None, expected_output_tokens: int = 512):
+        if hedge_percentile is not None and not 0 < hedge_percentile < 1:
+            raise ValueError(f"hedge_percentile must be a fraction in (0, 1), got {hedge_percentile}")
+        self.bucket = None
+        if requests_per_minute or tokens_per_minute:
+            # A limit that is not configured is effectively unbounded
+            self.bucket = TokenBucket(requests_per_minute or 10 ** 9, tokens_per_minute or 10 ** 9)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_percentile = hedge_percentile
+        self.expected_output_tokens = expected_output_tokens
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, _InflightCall] = {}
+        self._latencies = deque(maxlen=200)
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm") if hedge_percentile else None
+        self.metrics = {
+            "calls": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0,
+            "hedged": 0, "hedge_wins": 0, "queue_wait_seconds": 0.0,
+        }
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    def _estimate_tokens(self, messages: List) -> int:
+        chars = sum(len(str(getattr(m, "content", m))) for m in messages)
+        return chars // 4 + self.expected_output_tokens
+
+    def invoke(self, llm, messages: List, priority: str = "interactive"):
+        """Invokes `llm` with `messages` through the scheduler."""
+        self._count("calls")
+        key = (getattr(llm, "model_name", type(llm).__name__),
+               tuple(str(getattr(m, "content", m)) for m in messages))
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InflightCall()
+
+        if not leader:
+            self._count("coalesced")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._invoke_with_retry(llm, messages, PRIORITIES.get(priority, 0))
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def _invoke_with_retry(self, llm, messages: List, priority: int):
+        tokens = self._estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self._count("queue_wait_seconds", self.bucket.acquire(tokens, priority))
+            try:
+                return self._invoke_hedged(llm, messages, tokens)
+            except Exception as e:
+                if attempt == self.max_retries or not _is_rate_limited(e):
+                    raise
+                self._count("retries")
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                time.sleep(delay)
+
+    def _timed_invoke(self, llm, messages: List, tokens: int):
+        self._count("upstream_calls")
+        started = time.monotonic()
+        response = llm.invoke(messages)
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+        # Replace the estimate reserved for this call with the usage Groq reported
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens") and self.bucket is not None:
+            self.bucket.settle(tokens, usage["total_tokens"])
+        return response
+
+    def _hedge_after(self):
+        """Latency threshold after which a second request is sent, or None."""
+        with self._lock:
+            if not self.hedge_percentile or len(self._latencies) < 20:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile))
+        return ordered[index]
+
+    def _invoke_hedged(self, llm, messages: List, tokens: int):
+        threshold = self._hedge_after()
+        if threshold is None:
+            return self._timed_invoke(llm, messages, tokens)
+
+        primary = self._executor.submit(self._timed_invoke, llm, messages, tokens)
+        done, _ = wait([primary], timeout=threshold)
+        if done or (self.bucket is not None and not self.bucket.try_acquire(tokens)):
+            return primary.result()
+
+        self._count("hedged")
+        hedge = self._executor.submit(self._timed_invoke, llm, messages, tokens)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def get_metrics(self) -> Dict:
+        """Returns a snapshot of scheduler counters."""
+        with self._lock:
+            snapshot = dict(self.metrics)
+            snapshot["inflight"] = len(self._inflight)
+        snapshot["queued"] = len(self.bucket._waiters) if self.bucket is not None else 0
+        return snapshot
+
+
+class ScheduledLLM:
+    """Drop-in replacement for a chat model that routes `invoke` through the scheduler."""
+
+    def __init__(self, llm, priority: str = "interactive", scheduler: LLMScheduler = None):
+        self.llm = llm
+        self.priority = priority
+        self.scheduler = scheduler or get_scheduler()
+
+    def invoke(self, messages: List, priority: str = None):
+        return self.scheduler.invoke(self.llm, messages, priority or self.priority)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Returns the process-wide scheduler, configured from the environment."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            # Accepts a fraction (0.95) or a percentile (95)
+            hedge = float(os.environ.get("LLM_HEDGE_PERCENTILE") or 0)
+            if hedge >= 1:
+                hedge /= 100
+            _scheduler = LLMScheduler(
+                requests_per_minute=int(os.environ.get("GROQ_REQUESTS_PER_MINUTE") or 0) or None,
+                tokens_per_minute=int(os.environ.get("GROQ_TOKENS_PER_MINUTE") or 0) or None,
+                max_retries=int(os.environ.get("LLM_MAX_RETRIES", 4)),
+                hedge_percentile=hedge or None,
+            )
+        return _scheduler
+
+
+# One chat client per (model, temperature, key), shared by every agent
+_clients: Dict[tuple, object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(groq_api_key: str, model: str = "llama3-70b-8192", temperature: float = 0):
+    """Returns the pooled ChatGroq client for these settings, creating it on first use."""
+    key = (model, temperature, groq_api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            chat_groq = lazy_import("langchain_groq").ChatGroq
+            started = time.perf_counter()
+            # The scheduler owns retries; SDK-level retries would bypass its budget and backoff
+            client = _clients[key] = chat_groq(model=model, temperature=temperature, groq_api_key=groq_api_key,
+                                               max_retries=0)
+            record_timing(f"client:{model}", time.perf_counter() - started)
+        return client
+
+
+def shared_llm(groq_api_key: str, priority: str = "interactive", model: str = "llama3-70b-8192",
+               temperature: float = 0) -> ScheduledLLM:
+    """Scheduled handle on the pooled client; this is what agents keep as `self.llm`."""
+    return ScheduledLLM(get_llm_client(groq_api_key, model, temperature), priority=priority)
@@ -3,16 +3,23 @@ import re
 import json
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
+from agents.llm_scheduler import shared_llm
+from agents.frame_isolation import run_isolated
 
 class QueryExecutor:
     """Executes natural language queries on data using an AI agent."""
 
     def __init__(self, groq_api_key):
-        self.llm = ChatGroq(model="llama3-70b-8192", temperature=0, groq_api_key=groq_api_key)
+        self.llm = shared_llm(groq_api_key)
 
-    def execute_query(self, df: pd.DataFrame, query: str):
-        """Converts a user query into a Pandas command, executes it safely, and provides a justification."""
+    def execute_query(self, df: pd.DataFrame, query: str, conversation=None, record: bool = True):
+        """Converts a user query into a Pandas command, executes it safely, and provides a justification.
+
+        When a `ConversationState` is given, previous results are offered to the LLM as named
+        views so follow-up questions can run on those smaller frames, and the new result is
+        stored as a view in turn. With `record=False` (re-running a question for validation)
+        the views are used but nothing is stored, and views of this same question are hidden.
+        """
 
         # **🔹 Improved Prompt for Query Execution**
         prompt = PromptTemplate.from_template(
@@ -33,8 +40,14 @@ class QueryExecutor:
 
             - When selecting multiple columns, always use a **list** (`df[['col1', 'col2']]`) instead of a tuple (`df[('col1', 'col2')]`).
 
+            - Previous results are available as DataFrame variables (listed below). If the query is a follow-up
+              (e.g. "now only for the West region", "break that down by month"), **start from the matching previous
+              result** instead of recomputing from `df`, as long as it still has the columns you need.
+
             Query: {query}
             DataFrame Columns: {columns}
+            Previous Results:
+            {views}
 
             Example Transformations:
             - ["What is the total sales?", "What is the highest profit?"] → "What is the total sales and highest profit?"
@@ -50,7 +63,9 @@ class QueryExecutor:
             """
         )
 
-        query_message = prompt.format_prompt(query=query, columns=", ".join(df.columns))
+        exclude_query = None if record else query
+        views = conversation.describe_views(exclude_query) if conversation is not None else "None"
+        query_message = prompt.format_prompt(query=query, columns=", ".join(df.columns), views=views)
         query_response = self.llm.invoke([HumanMessage(content=query_message.to_string())])
         query_code = query_response.content.strip()
 
@@ -63,10 +78,11 @@ class QueryExecutor:
         if not query_code.startswith("result ="):
             return {"error": "Invalid Pandas command generated by LLM", "query_code": query_code}
 
-        # **🔹 Execute the query safely**
-        local_vars = {"df": df, "pd": pd}
+        # **🔹 Execute the query safely (on a copy-on-write view, so writes never reach the session frame)**
+        parents = conversation.referenced_views(query_code, exclude_query) if conversation is not None else []
         try:
-            exec(query_code, globals(), local_vars)
+            view_vars = conversation.view_vars(df, parents) if parents else None
+            local_vars = run_isolated(query_code, df, extra_vars=view_vars, source="query")
             result = local_vars.get("result")
         except Exception as e:
             return {"error": f"Query execution failed: {str(e)}", "query_code": query_code}
@@ -97,4 +113,8 @@ class QueryExecutor:
         justification_response = self.llm.invoke([HumanMessage(content=justification_message.to_string())])
         justification = justification_response.content.strip()
 
-        return {"result": result, "executed_code": query_code, "justification": justification}
+        view_name = None
+        if conversation is not None and record:
+            view_name = conversation.add_result(query, query_code, result, parents, df)
+
+        return {"result": result, "executed_code": query_code, "justification": justification, "view_name": view_name}
@@ -2,16 +2,16 @@ import re
 import json
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
+from agents.llm_scheduler import shared_llm
 
 class QueryToPython:
     """Converts natural language queries into executable Pandas (Python) code."""
 
     def __init__(self, groq_api_key):
-        self.llm = ChatGroq(model="llama3-70b-8192", temperature=0, groq_api_key=groq_api_key)
+        self.llm = shared_llm(groq_api_key)
 
-    def convert(self, df, queries):
-        """Generates Python (Pandas) code for the given queries."""
+    def convert(self, df, queries, conversation=None):
+        """Generates Python (Pandas) code for the given queries, building on previous results of the conversation."""
         
         prompt = PromptTemplate.from_template(
             """Convert the following natural language queries into valid Pandas code.
@@ -19,9 +19,13 @@ class QueryToPython:
             - Use the dataframe variable `df` (already provided).
             - Store the output in a variable called `result`.
             - Do NOT include explanations or markdown formatting.
+            - Previous results listed below are available as DataFrame variables; if the query is a follow-up,
+              start from the matching previous result.
 
             Queries: {queries}
             DataFrame Columns: {columns}
+            Previous Results:
+            {views}
 
             Example Output:
             ```python
@@ -30,7 +34,8 @@ class QueryToPython:
             """
         )
 
-        query_message = prompt.format_prompt(queries=json.dumps(queries), columns=", ".join(df.columns))
+        views = conversation.describe_views(exclude_query=queries) if conversation is not None else "None"
+        query_message = prompt.format_prompt(queries=json.dumps(queries), columns=", ".join(df.columns), views=views)
         query_response = self.llm.invoke([HumanMessage(content=query_message.to_string())])
         python_code = query_response.content.strip()
 
@@ -2,16 +2,16 @@ import re
 import json
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
+from agents.llm_scheduler import shared_llm
 
 class QueryToSQL:
     """Converts natural language queries into executable SQL code."""
 
     def __init__(self, groq_api_key):
-        self.llm = ChatGroq(model="llama3-70b-8192", temperature=0, groq_api_key=groq_api_key)
+        self.llm = shared_llm(groq_api_key)
 
-    def convert(self, queries, table_name):
-        """Generates SQL code for the given queries."""
+    def convert(self, queries, table_name, conversation=None):
+        """Generates SQL code for the given queries, taking previous questions of the conversation into account."""
         
         prompt = PromptTemplate.from_template(
             """Convert the following natural language queries into SQL queries.
@@ -19,8 +19,12 @@ class QueryToSQL:
             - Assume the data is stored in a SQL table named `{table_name}`.
             - Write a valid SQL SELECT query.
             - Do NOT include explanations or markdown formatting.
+            - If the query is a follow-up to the previous questions below (e.g. "now only for the West region"),
+              write a single self-contained query that applies it to the earlier question.
 
             Queries: {queries}
+            Previous Questions:
+            {previous_queries}
 
             Example Output:
             ```sql
@@ -29,7 +33,9 @@ class QueryToSQL:
             """
         )
 
-        query_message = prompt.format_prompt(queries=json.dumps(queries), table_name=table_name)
+        previous_queries = conversation.describe_queries(exclude_query=queries) if conversation is not None else "None"
+        query_message = prompt.format_prompt(queries=json.dumps(queries), table_name=table_name,
+                                             previous_queries=previous_queries)
         query_response = self.llm.invoke([HumanMessage(content=query_message.to_string())])
         sql_code = query_response.content.strip()
 
@@ -3,18 +3,20 @@
 import re
 import json
 import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
-from langchain_groq import ChatGroq
-from typing import Dict, List
+from agents.llm_scheduler import shared_llm
+from agents.lazy_loading import lazy_import
+from typing import Dict, List, Optional
+
+# Chart types whose data can be pre-aggregated, so appended rows are merged instead of recomputed
+AGGREGATABLE_TYPES = {"bar", "pie", "treemap", "sunburst"}
 
 class Visualization:
     """Generates suitable visualizations based on query results."""
 
     def __init__(self, groq_api_key):
-        self.llm = ChatGroq(model="llama3-70b-8192", temperature=0, groq_api_key=groq_api_key)
+        self.llm = shared_llm(groq_api_key)
 
     def recommend_visualization(self, df: pd.DataFrame, query: str, result) -> Dict:
         """Suggests best visualization types based on query and result."""
@@ -126,22 +128,56 @@ class Visualization:
         print("[auto_generate_visualizations] recommendations:", recommendations)
         return recommendations
 
-    def generate_visualization(self, df: pd.DataFrame, recommendations: List[Dict]) -> List[Dict]:
-        """Generates Plotly figure JSONs from recommendations."""
+    def aggregate_for(self, df: pd.DataFrame, rec: Dict) -> Optional[pd.DataFrame]:
+        """Pre-aggregates the data a chart needs; returns None for row-level charts (scatter, histogram, ...)."""
+        viz_type = rec.get("type", "").lower()
+        cols = rec.get("data_columns", [])
+        if viz_type not in AGGREGATABLE_TYPES:
+            return None
+        try:
+            if viz_type == "pie":
+                return df.groupby(cols[0]).size().reset_index(name="count")
+            keys, value = (cols[:1], cols[1]) if viz_type == "bar" else (cols[:-1], cols[-1])
+            if not keys or value in keys or not pd.api.types.is_numeric_dtype(df[value]):
+                return None
+            return df.groupby(keys)[value].sum(min_count=1).reset_index()
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+
+    def merge_aggregates(self, aggregate: Optional[pd.DataFrame], new_aggregate: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """Merges the partial aggregate of appended rows into an existing one (the last column holds the sums).
+
+        `min_count=1` keeps groups without any values as NaN (no bar) instead of 0, as the raw-row chart does.
+        """
+        if aggregate is None or new_aggregate is None:
+            return None
+        keys, value = list(aggregate.columns[:-1]), aggregate.columns[-1]
+        return pd.concat([aggregate, new_aggregate], ignore_index=True).groupby(keys)[value].sum(min_count=1).reset_index()
+
+    def generate_visualization(self, df: pd.DataFrame, recommendations: List[Dict], aggregates: List = None) -> List[Dict]:
+        """Generates Plotly figure JSONs from recommendations.
+
+        `aggregates` optionally lines up with the recommendations; where an entry from
+        `aggregate_for` is present, the chart is drawn from it instead of the raw rows.
+        """
         visualizations = []
+        # Plotly is only needed once charts are drawn; figure_factory is loaded for KDE plots only
+        px = lazy_import("plotly.express")
 
-        for rec in recommendations.get("recommendations", []):
+        for index, rec in enumerate(recommendations.get("recommendations", [])):
             viz_type = rec.get("type", "").lower()
             cols = rec.get("data_columns", [])
             title = rec.get("title", "Generated Visualization")
+            aggregate = aggregates[index] if aggregates and index < len(aggregates) else None
+            data = aggregate if aggregate is not None else df
 
             try:
                 if viz_type == "bar":
-                    fig = px.bar(df, x=cols[0], y=cols[1], title=title, color=cols[0])
+                    fig = px.bar(data, x=cols[0], y=cols[1], title=title, color=cols[0])
                 elif viz_type == "scatter":
                     fig = px.scatter(df, x=cols[0], y=cols[1], title=title, color=cols[0])
                 elif viz_type == "pie":
-                    fig = px.pie(df, names=cols[0], title=title)
+                    fig = px.pie(data, names=cols[0], values="count" if aggregate is not None else None, title=title)
                 elif viz_type == "box":
                     fig = px.box(df, y=cols[0], title=title)
                 elif viz_type == "violin":
@@ -149,15 +185,16 @@ class Visualization:
                 elif viz_type == "density_heatmap":
                     fig = px.density_heatmap(df, x=cols[0], y=cols[1], title=title)
                 elif viz_type == "kde":
+                    ff = lazy_import("plotly.figure_factory")
                     fig = ff.create_distplot([df[cols[0]].dropna()], group_labels=[cols[0]], show_hist=False)
                 elif viz_type == "area":
                     fig = px.area(df, x=cols[0], y=cols[1], title=title)
                 elif viz_type == "line_area":
                     fig = px.area(df, x=cols[0], y=cols[1], title=title)
                 elif viz_type == "treemap":
-                    fig = px.treemap(df, path=cols[:-1], values=cols[-1], title=title)
+                    fig = px.treemap(data, path=cols[:-1], values=cols[-1], title=title)
                 elif viz_type == "sunburst":
-                    fig = px.sunburst(df, path=cols[:-1], values=cols[-1], title=title)
+                    fig = px.sunburst(data, path=cols[:-1], values=cols[-1], title=title)
                 elif viz_type == "choropleth":
                     fig = px.choropleth(df, locations=cols[0], locationmode="country names", color=cols[1], title=title)
                 elif viz_type == "polar":
@@ -1,28 +1,21 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
 import io
 import os
+import sys
 import base64
-import numpy as np
-
-# Import Agents
-from agents.file_processing import FileProcessor
-from agents.query_execution import QueryExecutor
-from agents.answer_validation import AnswerValidation
-from agents.visualization import Visualization
-from agents.dashboard import Dashboard
-from agents.query_to_python import QueryToPython
-from agents.query_to_sql import QueryToSQL
-
-# Add this import for Plotly
-try:
-    import plotly.io as pio
-except ImportError:
-    pio = None
+import threading
+from collections import OrderedDict
+
+# Agents (and pandas, langchain, plotly behind them) are imported on first use
+from agents.lazy_loading import lazy_import, record_timing, get_startup_timings, get_startup_over_budget
+from agents.llm_scheduler import get_scheduler
 
 app = FastAPI(title="Agentic Visualization System API")
 
@@ -35,24 +28,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Agents
+# Initialize Agents lazily; all LLM-backed agents share one pooled client
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
-file_processor = FileProcessor(GROQ_API_KEY)
-query_executor = QueryExecutor(GROQ_API_KEY)
-validation_agent = AnswerValidation(GROQ_API_KEY)
-visualization_agent = Visualization(GROQ_API_KEY)
-dashboard_agent = Dashboard()
-python_converter = QueryToPython(GROQ_API_KEY)
-sql_converter = QueryToSQL(GROQ_API_KEY)
+AGENT_CLASSES = {
+    "file_processor": ("agents.file_processing", "FileProcessor", True),
+    "query_executor": ("agents.query_execution", "QueryExecutor", True),
+    "validation_agent": ("agents.answer_validation", "AnswerValidation", True),
+    "visualization_agent": ("agents.visualization", "Visualization", True),
+    "dashboard_agent": ("agents.dashboard", "Dashboard", False),
+    "python_converter": ("agents.query_to_python", "QueryToPython", True),
+    "sql_converter": ("agents.query_to_sql", "QueryToSQL", True),
+}
+_agents = {}
+_agents_lock = threading.Lock()
+
+def get_agent(name: str):
+    with _agents_lock:
+        if name not in _agents:
+            module_name, class_name, needs_key = AGENT_CLASSES[name]
+            agent_class = getattr(lazy_import(module_name), class_name)
+            started = time.perf_counter()
+            _agents[name] = agent_class(GROQ_API_KEY) if needs_key else agent_class()
+            record_timing(f"agent:{name}", time.perf_counter() - started)
+        return _agents[name]
+
+def get_plotly_io():
+    try:
+        return lazy_import("plotly.io")
+    except ImportError:
+        return None
+
+def warm_up():
+    """Builds every agent and loads the charting stack ahead of the first request."""
+    started = time.perf_counter()
+    for name in AGENT_CLASSES:
+        get_agent(name)
+    for module_name in ("plotly.express", "plotly.figure_factory"):
+        lazy_import(module_name)
+    record_timing("warm_up", time.perf_counter() - started)
+
+@app.on_event("startup")
+def warm_up_on_startup():
+    # Copy-on-write is process-global in pandas 2, so it is switched on here, before any
+    # session frame exists and before request threads run pandas
+    lazy_import("agents.frame_isolation").enable_copy_on_write()
+    # Opt-in so autoscaled containers can start serving before the heavy imports finish
+    if os.environ.get("WARMUP_ON_STARTUP", "").lower() in ("1", "true", "yes"):
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
 # In-memory storage for uploaded data (for demo; use DB in prod)
 DATA_STORAGE = {}
+# Per-session history of query results, reused as views by follow-up questions
+CONVERSATIONS = {}
+# Per-session column statistics, merged incrementally on append
+PROFILES = {}
+# Per-session LRU of chart recommendations and their partial aggregates, keyed by (query, result).
+# Figures are not stored: aggregated charts are redrawn from the small aggregates, row-level charts
+# from the session frame, so memory does not grow with every distinct question.
+VISUALIZATION_CACHE = {}
+VISUALIZATION_CACHE_MAX_ENTRIES = int(os.environ.get("VISUALIZATION_CACHE_MAX_ENTRIES", 20))
+# Serialises /append and the chart cache of a session, which both read-modify-write the dicts above
+SESSION_LOCKS = {}
+_session_locks_lock = threading.Lock()
+
+def get_session_lock(session_id: str):
+    with _session_locks_lock:
+        return SESSION_LOCKS.setdefault(session_id, threading.Lock())
 
 class FileOverviewResponse(BaseModel):
     dataframe_head: list
     file_overview: str
     columns: list
     session_id: str
+    profile: dict = None
+
+class AppendResponse(BaseModel):
+    session_id: str
+    rows_appended: int
+    total_rows: int
+    profile: dict
+    charts_merged: int
+    charts_invalidated: int
+    views_invalidated: int
 
 class QueryRequest(BaseModel):
     session_id: str
@@ -62,6 +119,7 @@ class QueryResponse(BaseModel):
     result: str
     justification: str
     executed_code: str
+    view_name: str = None
 
 class CodeConversionResponse(BaseModel):
     python_code: str
@@ -80,6 +138,7 @@ class VisualizationResponse(BaseModel):
     visualizations: list  # Each item: {"type": ..., "image_base64": ...}
 
 def convert_ndarray_to_list(obj):
+    np = lazy_import("numpy")
     if isinstance(obj, np.ndarray):
         return obj.tolist()
     elif isinstance(obj, dict):
@@ -94,17 +153,76 @@ def upload_file(file: UploadFile = File(...)):
     file_bytes = file.file.read()
     file_type = file.filename.split(".")[-1].lower()
     file_data = file_bytes.decode("utf-8") if file_type == "csv" else file_bytes
-    file_info = file_processor.process_file(file_data, file_type)
+    file_info = get_agent("file_processor").process_file(file_data, file_type)
     if "error" in file_info:
         return JSONResponse(status_code=400, content={"error": file_info["error"]})
     df = file_info["dataframe"]
     session_id = os.urandom(8).hex()
     DATA_STORAGE[session_id] = df
+    CONVERSATIONS[session_id] = lazy_import("agents.conversation").ConversationState(source=df)
+    PROFILES[session_id] = get_agent("file_processor").profile_dataframe(df)
     return FileOverviewResponse(
         dataframe_head=df.head().to_dict(orient="records"),
         file_overview=file_info["file_overview"],
         columns=list(df.columns),
-        session_id=session_id
+        session_id=session_id,
+        profile=PROFILES[session_id]
+    )
+
+@app.post("/append", response_model=AppendResponse)
+def append_rows(session_id: str = Form(...), file: UploadFile = File(...)):
+    """Adds new rows to an existing session without re-running the overview or auto-visualizations."""
+    if session_id not in DATA_STORAGE:
+        return JSONResponse(status_code=404, content={"error": "Session not found"})
+    file_bytes = file.file.read()
+    file_type = file.filename.split(".")[-1].lower()
+    file_data = file_bytes.decode("utf-8") if file_type == "csv" else file_bytes
+    file_processor = get_agent("file_processor")
+    file_info = file_processor.read_file(file_data, file_type)
+    if "error" in file_info:
+        return JSONResponse(status_code=400, content={"error": file_info["error"]})
+    visualization_agent = get_agent("visualization_agent")
+
+    with get_session_lock(session_id):
+        df = DATA_STORAGE[session_id]
+        append_info = file_processor.append_rows(df, file_info["dataframe"])
+        if "error" in append_info:
+            return JSONResponse(status_code=400, content={"error": append_info["error"]})
+        combined = append_info["dataframe"]
+        new_rows = combined.iloc[len(df):]
+        DATA_STORAGE[session_id] = combined
+
+        # Profile: merge statistics of the new rows instead of rescanning the whole frame
+        dtypes = {str(col): dtype for col, dtype in combined.dtypes.items()}
+        profile = PROFILES.get(session_id) or file_processor.profile_dataframe(df)
+        profile = file_processor.merge_profiles(profile, file_processor.profile_dataframe(new_rows), dtypes)
+        PROFILES[session_id] = profile
+
+        # Charts: merge partial aggregates; row-level charts are drawn from the new frame on next /visualize
+        charts_merged = charts_invalidated = 0
+        for entry in VISUALIZATION_CACHE.get(session_id, {}).values():
+            for index, rec in enumerate(entry["recommendations"]):
+                aggregate = visualization_agent.merge_aggregates(
+                    entry["aggregates"][index], visualization_agent.aggregate_for(new_rows, rec)
+                )
+                entry["aggregates"][index] = aggregate
+                if aggregate is not None:
+                    charts_merged += 1
+                else:
+                    charts_invalidated += 1
+
+        # Query results all derive from the session frame, so their views are recomputed lazily
+        conversation = CONVERSATIONS.get(session_id)
+        views_invalidated = conversation.invalidate(combined) if conversation is not None else 0
+
+    return AppendResponse(
+        session_id=session_id,
+        rows_appended=len(new_rows),
+        total_rows=len(combined),
+        profile=profile,
+        charts_merged=charts_merged,
+        charts_invalidated=charts_invalidated,
+        views_invalidated=views_invalidated
     )
 
 @app.post("/query", response_model=QueryResponse)
@@ -112,13 +230,14 @@ def process_query(req: QueryRequest):
     df = DATA_STORAGE.get(req.session_id)
     if df is None:
         return JSONResponse(status_code=404, content={"error": "Session not found"})
-    query_result = query_executor.execute_query(df, req.query)
+    query_result = get_agent("query_executor").execute_query(df, req.query, CONVERSATIONS.get(req.session_id))
     if "error" in query_result:
         return JSONResponse(status_code=400, content={"error": query_result["error"]})
     return QueryResponse(
         result=str(query_result["result"]),
         justification=query_result["justification"],
-        executed_code=query_result.get("executed_code", "")
+        executed_code=query_result.get("executed_code", ""),
+        view_name=query_result.get("view_name")
     )
 
 @app.post("/convert_code", response_model=CodeConversionResponse)
@@ -126,8 +245,9 @@ def convert_code(req: QueryRequest):
     df = DATA_STORAGE.get(req.session_id)
     if df is None:
         return JSONResponse(status_code=404, content={"error": "Session not found"})
-    python_code = python_converter.convert(df, req.query)["python_code"]
-    sql_code = sql_converter.convert(req.query, table_name="uploaded_data")["sql_code"]
+    conversation = CONVERSATIONS.get(req.session_id)
+    python_code = get_agent("python_converter").convert(df, req.query, conversation)["python_code"]
+    sql_code = get_agent("sql_converter").convert(req.query, table_name="uploaded_data", conversation=conversation)["sql_code"]
     return CodeConversionResponse(python_code=python_code, sql_code=sql_code)
 
 @app.post("/validate", response_model=ValidationResponse)
@@ -136,9 +256,11 @@ def validate(req: QueryRequest):
     if df is None:
         return JSONResponse(status_code=404, content={"error": "Session not found"})
     # For validation, need executed_code and result; here, we assume frontend provides them or you can extend the model
-    query_result = query_executor.execute_query(df, req.query)
-    validation_result = validation_agent.validate_result(
-        df, req.query, query_result.get("executed_code", ""), query_result["result"]
+    # Re-run with the conversation's views (so follow-ups match /query) without recording a new view
+    conversation = CONVERSATIONS.get(req.session_id)
+    query_result = get_agent("query_executor").execute_query(df, req.query, conversation, record=False)
+    validation_result = get_agent("validation_agent").validate_result(
+        df, req.query, query_result.get("executed_code", ""), query_result["result"], conversation
     )
     return ValidationResponse(
         validation_message=validation_result["validation_message"],
@@ -150,11 +272,37 @@ def visualize(req: VisualizationRequest):
     df = DATA_STORAGE.get(req.session_id)
     if df is None:
         return JSONResponse(status_code=404, content={"error": "Session not found"})
-    if req.query:
-        viz_recommendations = visualization_agent.recommend_visualization(df, req.query, req.result)
-    else:
-        viz_recommendations = visualization_agent.auto_generate_visualizations(df)
-    visualizations = visualization_agent.generate_visualization(df, viz_recommendations)
+    visualization_agent = get_agent("visualization_agent")
+    pio = get_plotly_io()
+    key = (req.query, req.result)
+    viz_recommendations = None
+    if key not in VISUALIZATION_CACHE.get(req.session_id, {}):
+        # The LLM call runs outside the session lock so it does not hold up appends
+        if req.query:
+            viz_recommendations = visualization_agent.recommend_visualization(df, req.query, req.result)
+        else:
+            viz_recommendations = visualization_agent.auto_generate_visualizations(df)
+
+    with get_session_lock(req.session_id):
+        df = DATA_STORAGE[req.session_id]
+        cache = VISUALIZATION_CACHE.setdefault(req.session_id, OrderedDict())
+        entry = cache.get(key)
+        if entry is None:
+            recommendations = viz_recommendations.get("recommendations", [])
+            entry = {
+                "recommendations": recommendations,
+                "aggregates": [visualization_agent.aggregate_for(df, rec) for rec in recommendations],
+            }
+            if "error" not in viz_recommendations:
+                cache[key] = entry
+                while len(cache) > VISUALIZATION_CACHE_MAX_ENTRIES:
+                    cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        # Snapshot under the lock; drawing happens outside it
+        recommendations = list(entry["recommendations"])
+        aggregates = list(entry["aggregates"])
+    visualizations = visualization_agent.generate_visualization(df, {"recommendations": recommendations}, aggregates)
     viz_list = []
     for viz in visualizations:
         # Matplotlib Figure
@@ -180,6 +328,25 @@ def visualize(req: VisualizationRequest):
             continue
     return VisualizationResponse(visualizations=viz_list)
 
+@app.post("/warmup")
+def warmup():
+    warm_up()
+    return {"startup": get_startup_timings(), "startup_over_budget": get_startup_over_budget()}
+
+@app.get("/metrics")
+def metrics():
+    # Only report isolation counters once pandas has been loaded by a query
+    frame_isolation = sys.modules.get("agents.frame_isolation")
+    return {
+        "frame_isolation": frame_isolation.get_isolation_metrics() if frame_isolation else {},
+        "llm_scheduler": get_scheduler().get_metrics(),
+        "startup": get_startup_timings(),
+        "startup_over_budget": get_startup_over_budget(),
+    }
+
 @app.get("/")
 def root():
     return {"message": "Welcome to the Agentic Visualization System API. See /docs for usage."}
+
+# Import-time profile; like every recorded step it is checked against STARTUP_BUDGET_SECONDS
+record_timing("import:main", time.perf_counter() - _IMPORT_STARTED)